@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import functools
+import logging
+
+# Constants
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3")
+
+
+def cache_key(model, temperature, prompt, text):
+    """Build a content-addressed key for an LLM request."""
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "prompt": prompt, "text": text},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMCache:
+    """On-disk cache of LLM responses backed by SQLite."""
+
+    def __init__(self, path=CACHE_PATH, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.connection = None
+
+    def _connect(self):
+        """Open the database on first use and make sure the table exists."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT, created_at INT)"
+            )
+        return self.connection
+
+    def get(self, key):
+        """Return the cached response for a key, or None on a miss."""
+        if not self.enabled:
+            return None
+        row = (
+            self._connect()
+            .execute("SELECT response FROM responses WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def set(self, key, response):
+        """Store a response under a key."""
+        if not self.enabled:
+            return
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+            (key, response, int(time.time())),
+        )
+        connection.commit()
+
+    def close(self):
+        """Close the database connection if it is open."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def cached_llm(cache, prompt, temperature):
+    """Memoize an LLM call that takes `text` and `model` arguments.
+
+    Empty responses are treated as failures and never cached.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_for(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return cache_key(
+                bound.arguments["model"], temperature, prompt, bound.arguments["text"]
+            )
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = key_for(args, kwargs)
+                response = cache.get(key)
+                if response is not None:
+                    logging.debug("Using cached LLM response")
+                    return response
+                response = await func(*args, **kwargs)
+                if response:
+                    cache.set(key, response)
+                return response
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            response = cache.get(key)
+            if response is not None:
+                logging.debug("Using cached LLM response")
+                return response
+            response = func(*args, **kwargs)
+            if response:
+                cache.set(key, response)
+            return response
+
+        return wrapper
+
+    return decorator
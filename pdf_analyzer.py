@@ -1,11 +1,28 @@
 import os
+import argparse
 import logging
-import time
-import PyPDF2
+import asyncio
+import pymupdf
+import tiktoken
 import openai
 import json
+import re
+import hashlib
+import heapq
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from aiolimiter import AsyncLimiter
+from openai import AsyncOpenAI
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 from tqdm import tqdm
+from llm_cache import LLMCache, cache_key, cached_llm
 
 # Set up logging
 logging.basicConfig(
@@ -17,24 +34,71 @@ logging.basicConfig(
 # Constants
 PDF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "manifest.json")
 MAX_TOKENS = 4000  # Maximum number of tokens for each chunk to send to OpenAI
 OVERLAP_TOKENS = 200  # Overlap between chunks to maintain context
+MAX_CONCURRENT_REQUESTS = 10  # Maximum number of in-flight OpenAI requests
+ANALYSIS_MODEL = "gpt-4o-mini"  # Fast, cheap model for the per-chunk analyses
+SUMMARY_MODEL = "gpt-4o"  # Flagship model for the final report
+MAX_REQUESTS_PER_MINUTE = 500  # Account rate limit for requests to ANALYSIS_MODEL
+MAX_TOKENS_PER_MINUTE = 200000  # Account rate limit for tokens to ANALYSIS_MODEL
+EXTRACTION_WORKERS = os.cpu_count() or 1  # Number of processes extracting PDF text
+ANALYSIS_MAX_TOKENS = 1500  # Maximum number of tokens in each chunk analysis
+ANALYSIS_TEMPERATURE = 0.2
+BATCH_SIZE = 4  # Maximum number of chunks packed into a single OpenAI request
+BATCH_MAX_TOKENS = 24000  # Estimated token budget for a single batched request
+JSON_MODE_MODELS = ("gpt-4o", "gpt-4-turbo")  # Models supporting JSON mode
+CONDENSE_MAX_INPUT_TOKENS = 50000  # Maximum number of tokens condensed in one request
+CONDENSE_MAX_TOKENS = 500  # Maximum number of tokens in each condensed summary
+SUMMARY_MAX_INPUT_TOKENS = 100000  # Maximum number of tokens of summaries in the report prompt
+SUMMARY_TEMPERATURE = 0.3
+HASH_BLOCK_SIZE = 1 << 20  # Size of the blocks read when hashing PDFs
+MAX_CHUNKS_PER_PDF = 8  # Number of highest-scoring chunks analyzed per PDF (0 for all)
+MIN_CHUNK_WORDS = 50  # Chunks with fewer words are redaction blocks, cover sheets or graphics
+MIN_UNIQUE_WORD_RATIO = 0.1  # Chunks with a lower ratio are repetitive OCR noise or boilerplate
+WORD_RE = re.compile(r"[^\W\d_]{2,}")  # Words in any script, without redaction marks, digits and OCR debris
+MAX_ATTEMPTS = 8  # Maximum number of attempts of each OpenAI request
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
 
 # Configuration for analysis
-ANALYSIS_PROMPT = """
+ANALYSIS_INSTRUCTIONS = """
 You are an expert historian and intelligence analyst reviewing declassified JFK assassination documents.
-Based on the following document excerpt, please:
+Based on the document excerpt provided by the user, please:
 1. Identify key information related to potential motives for Kennedy's assassination
 2. Note any suspicious activities, connections, or entities mentioned
 3. Look for information about Lee Harvey Oswald and his potential connections
 4. Extract details about any conspiracy theories supported by the documents
 5. Identify any cover-up attempts or inconsistencies in the official narrative
 
+Provide a detailed, objective analysis focusing only on information present in the excerpt that might help answer 
+"Why was President Kennedy assassinated?" Do not speculate beyond what's in the text.
+"""
+
+# Only the document excerpt varies between requests, so it is sent after the static
+# instructions as its own user message
+DOCUMENT_TEMPLATE = """
 Document excerpt:
 {text}
+"""
 
-Provide a detailed, objective analysis focusing only on information present in this excerpt that might help answer 
-"Why was President Kennedy assassinated?" Do not speculate beyond what's in the text.
+BATCH_INSTRUCTIONS = """
+The excerpt above consists of {count} separate document excerpts, each introduced by a <<<CHUNK n>>> marker.
+Analyze each excerpt independently. Return a JSON object of the form {{"analyses": [...]}} whose array
+contains exactly {count} strings, one analysis per excerpt, in order.
+"""
+
+CONDENSE_PROMPT = """
+You are a historical researcher condensing analyses of declassified JFK assassination documents.
+Summarize the following analyses in a single dense paragraph. Keep the names, dates, places, organizations,
+connections and suspected motives that help answer "Why was President Kennedy assassinated?", and keep the
+names of the documents they come from so that they can be cited. Do not add anything that is not in the analyses.
+
+{text}
 """
 
 SUMMARY_PROMPT = """
@@ -57,6 +121,32 @@ conclusion that offers your assessment on the most probable explanation for Kenn
 this documentary evidence.
 """
 
+# Cache of chunk analyses shared across runs
+cache = LLMCache()
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Analyze JFK documents with OpenAI.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore and do not update the on-disk LLM response cache",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="JSONL_PATH",
+        help="Resume an interrupted run by skipping the chunks recorded in its analyses file",
+    )
+    parser.add_argument(
+        "--max-chunks-per-pdf",
+        type=int,
+        default=MAX_CHUNKS_PER_PDF,
+        metavar="K",
+        help="Only analyze the K highest-scoring chunks of each PDF (0 to analyze all)",
+    )
+    return parser.parse_args()
+
 
 def create_output_directory():
     """Create the output directory if it doesn't exist."""
@@ -65,52 +155,100 @@ def create_output_directory():
         logging.info(f"Created directory: {OUTPUT_DIR}")
 
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text content from a PDF file."""
-    try:
-        with open(pdf_path, "rb") as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-            return text
-    except Exception as e:
-        logging.error(f"Error extracting text from {pdf_path}: {e}")
-        return ""
+def iter_pages(pdf_path):
+    """Yield the text content of each page of a PDF file."""
+    with pymupdf.open(pdf_path) as doc:
+        for page in doc:
+            yield page.get_text("text")
+
+
+@functools.cache
+def get_encoding(model=ANALYSIS_MODEL):
+    """Return the tokenizer for a model, loading it once per process."""
+    return tiktoken.encoding_for_model(model)
 
 
-def split_text_into_chunks(text, max_tokens=MAX_TOKENS, overlap=OVERLAP_TOKENS):
-    """Split the text into overlapping chunks to maintain context."""
-    words = text.split()
-    chunks = []
+def iter_chunks(pages, max_tokens=MAX_TOKENS, overlap=OVERLAP_TOKENS):
+    """Yield overlapping chunks of tokens as pages stream in to maintain context."""
+    encoding = get_encoding()
+    window = deque()
+    pending = 0  # Number of tokens in the window not yet emitted in any chunk
 
-    if len(words) <= max_tokens:
-        return [text]
+    for page in pages:
+        for token in encoding.encode(page + "\n", disallowed_special=()):
+            window.append(token)
+            pending += 1
+            if len(window) == max_tokens:
+                yield encoding.decode(list(window))
+                for _ in range(max_tokens - overlap):
+                    window.popleft()
+                pending = 0
 
-    i = 0
-    while i < len(words):
-        chunk = " ".join(words[i : i + max_tokens])
-        chunks.append(chunk)
-        i += max_tokens - overlap
+    if pending:
+        yield encoding.decode(list(window))
 
-    return chunks
 
+class RateLimiter:
+    """Shared throttler for requests-per-minute and tokens-per-minute limits."""
 
-def analyze_text_with_openai(text, model="gpt-4"):
+    def __init__(self, max_requests_per_minute, max_tokens_per_minute):
+        self.requests = AsyncLimiter(max_requests_per_minute, 60)
+        self.tokens = AsyncLimiter(max_tokens_per_minute, 60)
+
+    async def acquire(self, tokens):
+        """Wait until one request and the given number of tokens are available."""
+        await self.tokens.acquire(min(tokens, self.tokens.max_rate))
+        await self.requests.acquire()
+
+
+@functools.cache
+def count_instruction_tokens():
+    """Count the tokens of the static analysis instructions once per process."""
+    return len(get_encoding().encode(ANALYSIS_INSTRUCTIONS, disallowed_special=()))
+
+
+def estimate_tokens(text, max_tokens=ANALYSIS_MAX_TOKENS):
+    """Estimate the tokens consumed by a request for the given text."""
+    document_tokens = len(
+        get_encoding().encode(DOCUMENT_TEMPLATE.format(text=text), disallowed_special=())
+    )
+    return count_instruction_tokens() + document_tokens + max_tokens
+
+
+def retrying():
+    """Retry transient OpenAI errors with exponential backoff and jitter."""
+    return AsyncRetrying(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        wait=wait_random_exponential(min=1, max=60),
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        reraise=True,
+    )
+
+
+async def create_completion(client, limiter, tokens, **kwargs):
+    """Create a chat completion under the rate limiter, retrying transient errors."""
+    async for attempt in retrying():
+        with attempt:
+            await limiter.acquire(tokens)
+            response = await client.chat.completions.create(**kwargs)
+    return response
+
+
+@cached_llm(cache, ANALYSIS_INSTRUCTIONS + DOCUMENT_TEMPLATE, ANALYSIS_TEMPERATURE)
+async def analyze_text_with_openai(client, limiter, text, model=ANALYSIS_MODEL):
     """Send text to OpenAI API for analysis."""
     try:
-        response = openai.ChatCompletion.create(
+        response = await create_completion(
+            client,
+            limiter,
+            estimate_tokens(text),
             model=model,
             messages=[
-                {
-                    "role": "system",
-                    "content": "You are a historical analyst specializing in the JFK assassination.",
-                },
-                {"role": "user", "content": ANALYSIS_PROMPT.format(text=text)},
+                {"role": "system", "content": ANALYSIS_INSTRUCTIONS},
+                {"role": "user", "content": DOCUMENT_TEMPLATE.format(text=text)},
             ],
-            max_tokens=1500,
-            temperature=0.2,
+            max_tokens=ANALYSIS_MAX_TOKENS,
+            temperature=ANALYSIS_TEMPERATURE,
         )
         return response.choices[0].message.content
     except Exception as e:
@@ -118,37 +256,463 @@ def analyze_text_with_openai(text, model="gpt-4"):
         return ""
 
 
-def generate_summary_report(analyses, model="gpt-4"):
-    """Generate a comprehensive summary report from all analyses."""
+async def analyze_texts_with_openai(client, limiter, texts, model=ANALYSIS_MODEL):
+    """Send several texts to OpenAI API in one request.
+
+    Returns None if the texts should be analyzed one at a time instead, and an empty
+    analysis for every text if the request failed after all retries.
+    """
+    packed = "\n\n".join(f"<<<CHUNK {i}>>>\n{text}" for i, text in enumerate(texts))
+    options = {}
+    if model.startswith(JSON_MODE_MODELS):
+        options["response_format"] = {"type": "json_object"}
+
     try:
-        response = openai.ChatCompletion.create(
+        response = await create_completion(
+            client,
+            limiter,
+            sum(estimate_tokens(text) for text in texts),
             model=model,
             messages=[
+                {"role": "system", "content": ANALYSIS_INSTRUCTIONS},
                 {
-                    "role": "system",
-                    "content": "You are a historical researcher specializing in the JFK assassination.",
+                    "role": "user",
+                    "content": DOCUMENT_TEMPLATE.format(text=packed)
+                    + BATCH_INSTRUCTIONS.format(count=len(texts)),
                 },
-                {"role": "user", "content": SUMMARY_PROMPT.format(analyses=analyses)},
             ],
-            max_tokens=4000,
-            temperature=0.3,
+            max_tokens=ANALYSIS_MAX_TOKENS * len(texts),
+            temperature=ANALYSIS_TEMPERATURE,
+            **options,
+        )
+    except openai.BadRequestError as e:
+        # For example a batch over the context length, which single requests may fit in
+        logging.warning(f"Rejected batch of {len(texts)} chunks: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Error analyzing batch of {len(texts)} chunks with OpenAI: {e}")
+        return [""] * len(texts)
+
+    try:
+        analyses = json.loads(response.choices[0].message.content)["analyses"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        logging.warning(f"Unparseable analyses for batch of {len(texts)} chunks: {e}")
+        return None
+
+    if not (
+        isinstance(analyses, list)
+        and len(analyses) == len(texts)
+        and all(isinstance(analysis, str) for analysis in analyses)
+    ):
+        logging.warning(f"Malformed analyses for batch of {len(texts)} chunks")
+        return None
+    return analyses
+
+
+async def analyze_batch(client, limiter, texts, model=ANALYSIS_MODEL):
+    """Analyze a batch of texts, packing the uncached ones into a single request."""
+    prompt = ANALYSIS_INSTRUCTIONS + DOCUMENT_TEMPLATE
+    keys = [cache_key(model, ANALYSIS_TEMPERATURE, prompt, text) for text in texts]
+    analyses = [cache.get(key) for key in keys]
+    misses = [i for i, analysis in enumerate(analyses) if analysis is None]
+
+    if len(misses) > 1:
+        batch = await analyze_texts_with_openai(
+            client, limiter, [texts[i] for i in misses], model=model
+        )
+        if batch is not None:
+            for i, analysis in zip(misses, batch):
+                analyses[i] = analysis
+                if analysis:
+                    cache.set(keys[i], analysis)
+            return analyses
+        logging.warning(f"Falling back to analyzing {len(misses)} chunks one at a time")
+
+    for i in misses:
+        analyses[i] = await analyze_text_with_openai(client, limiter, texts[i], model=model)
+    return analyses
+
+
+def score_chunk(chunk):
+    """Score the information content of a chunk, or 0 if it is not worth analyzing."""
+    words = [word.lower() for word in WORD_RE.findall(chunk)]
+    if len(words) < MIN_CHUNK_WORDS:
+        return 0
+    unique_words = len(set(words))
+    if unique_words / (len(words) + 1) < MIN_UNIQUE_WORD_RATIO:
+        return 0
+    return unique_words
+
+
+def extract_chunks(pdf_path, max_chunks=MAX_CHUNKS_PER_PDF):
+    """Extract a PDF file into its chunk count, the (index, SHA-256 digest, chunk) of its
+    best chunks, and whether the extraction failed partway.
+
+    Low-signal chunks are dropped, and only the max_chunks highest-scoring chunks are
+    held in memory and returned, in their original order. With max_chunks=0 every
+    remaining chunk of the document is returned. The chunks extracted before a failure
+    are still returned.
+    """
+    best = []  # Min-heap of (score, -index, chunk), so ties evict later chunks first
+    total = 0
+    failed = False
+    try:
+        for i, chunk in enumerate(iter_chunks(iter_pages(pdf_path))):
+            total += 1
+            score = score_chunk(chunk)
+            if not score:
+                continue
+            if not max_chunks or len(best) < max_chunks:
+                heapq.heappush(best, (score, -i, chunk))
+            else:
+                heapq.heappushpop(best, (score, -i, chunk))
+    except Exception as e:
+        logging.error(f"Error extracting text from {pdf_path}: {e}")
+        failed = True
+
+    best.sort(key=lambda item: -item[1])
+    chunks = [
+        (-neg_i, hashlib.sha256(chunk.encode()).digest(), chunk)
+        for _, neg_i, chunk in best
+    ]
+    return total, chunks, failed
+
+
+class AnalysisPipeline:
+    """Streams chunks from a process pool of extractors to a pool of analysis workers.
+
+    Each unique chunk is analyzed once, and every completed (pdf_file, index) analysis
+    is appended to a JSONL file so that an interrupted run can be resumed.
+    """
+
+    def __init__(
+        self, client, limiter, analyses_file, completed, max_chunks=MAX_CHUNKS_PER_PDF
+    ):
+        self.client = client
+        self.limiter = limiter
+        self.analyses_file = analyses_file
+        self.completed = completed
+        self.max_chunks = max_chunks
+        self.queue = asyncio.Queue(maxsize=MAX_CONCURRENT_REQUESTS)
+        self.owners = {}
+        self.analyses = {}
+        self.chunk_counts = {}
+        self.failed = set()
+        self.progress = None
+
+    def record(self, owner, analysis):
+        """Durably append a completed chunk analysis to the JSONL file."""
+        if not analysis:
+            return
+        pdf_file, i = owner
+        record = {"pdf": pdf_file, "chunk": i, "analysis": analysis}
+        self.analyses_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.analyses_file.flush()
+        os.fsync(self.analyses_file.fileno())
+
+    async def enqueue_chunks(self, pdf_file, extraction):
+        """Wait for the extraction of a PDF and enqueue each of its unique chunks once."""
+        total, chunks, failed = await extraction
+        self.chunk_counts[pdf_file] = total
+        if failed:
+            self.failed.add(pdf_file)
+        if not total:
+            logging.warning(f"No text content extracted from {pdf_file}")
+            return
+
+        for i, h, chunk in chunks:
+            owner = (pdf_file, i)
+            first = h not in self.owners
+            self.owners.setdefault(h, []).append(owner)
+
+            if owner in self.completed:
+                # Analyzed by a previous run; seed the result for later duplicates
+                if first:
+                    self.analyses[h] = self.completed[owner]
+            elif h in self.analyses:
+                self.record(owner, self.analyses[h])
+            elif first:
+                await self.queue.put((h, chunk))
+
+        logging.info(
+            f"Split {pdf_file} into {total} chunks, selected {len(chunks)} for analysis"
+        )
+
+    async def produce(self, pdf_files):
+        """Extract PDFs in a process pool and stream their unique chunks into the queue."""
+        loop = asyncio.get_running_loop()
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS) as pool:
+            for pdf_file in tqdm(pdf_files, desc="Processing PDFs"):
+                pdf_path = os.path.join(PDF_DIR, pdf_file)
+                logging.info(f"Processing {pdf_file}")
+                extraction = loop.run_in_executor(
+                    pool, extract_chunks, pdf_path, self.max_chunks
+                )
+                pending.append((pdf_file, extraction))
+
+                # Bound the number of extracted documents waiting to be enqueued
+                if len(pending) >= EXTRACTION_WORKERS * 2:
+                    await self.enqueue_chunks(*pending.popleft())
+
+            while pending:
+                await self.enqueue_chunks(*pending.popleft())
+
+    async def consume(self):
+        """Analyze batches of chunks from the queue until a None sentinel is received."""
+        carry = None
+        done = False
+
+        while not done:
+            item = carry if carry is not None else await self.queue.get()
+            carry = None
+            if item is None:
+                return
+
+            # Pack chunks that are already waiting into the batch while they fit
+            batch = [item]
+            tokens = estimate_tokens(item[1])
+            while len(batch) < BATCH_SIZE and not self.queue.empty():
+                next_item = self.queue.get_nowait()
+                if next_item is None:
+                    done = True
+                    break
+                next_tokens = estimate_tokens(next_item[1])
+                if tokens + next_tokens > BATCH_MAX_TOKENS:
+                    carry = next_item
+                    break
+                batch.append(next_item)
+                tokens += next_tokens
+
+            results = await analyze_batch(
+                self.client, self.limiter, [chunk for _, chunk in batch]
+            )
+            for (h, _), analysis in zip(batch, results):
+                self.analyses[h] = analysis
+                for owner in self.owners[h]:
+                    if owner not in self.completed:
+                        self.record(owner, analysis)
+            self.progress.update(len(batch))
+
+    async def run(self, pdf_files):
+        """Analyze every PDF, returning analyses keyed by (pdf_file, index) and chunk counts."""
+        self.progress = tqdm(desc="Analyzing chunks")
+        try:
+            # A failing worker or producer cancels the others instead of leaving
+            # the producer blocked on a full queue
+            async with asyncio.TaskGroup() as group:
+                workers = [
+                    group.create_task(self.consume())
+                    for _ in range(MAX_CONCURRENT_REQUESTS)
+                ]
+                await self.produce(pdf_files)
+                for _ in workers:
+                    await self.queue.put(None)
+        finally:
+            self.progress.close()
+
+        # Log how many low-signal and duplicate chunks were skipped
+        total = sum(self.chunk_counts.values())
+        selected = sum(len(chunk_owners) for chunk_owners in self.owners.values())
+        logging.info(f"Selected {selected} of {total} chunks for analysis")
+        duplicates = selected - len(self.owners)
+        ratio = duplicates / selected if selected else 0
+        logging.info(
+            f"Deduplicated {selected} chunks into {len(self.owners)} unique chunks "
+            f"({duplicates} duplicates, {ratio:.1%})"
+        )
+
+        # Fan the analysis of each unique chunk back out to every owner
+        results = {
+            owner: self.analyses[h]
+            for h, chunk_owners in self.owners.items()
+            for owner in chunk_owners
+        }
+        return results, self.chunk_counts
+
+
+def count_tokens(text):
+    """Count the tokens of a text."""
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def group_by_tokens(texts, max_tokens):
+    """Greedily group consecutive texts so that each group fits in max_tokens."""
+    groups = []
+    group = []
+    tokens = 0
+    for text in texts:
+        text_tokens = count_tokens(text)
+        if group and tokens + text_tokens > max_tokens:
+            groups.append(group)
+            group = []
+            tokens = 0
+        group.append(text)
+        tokens += text_tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+@cached_llm(cache, CONDENSE_PROMPT, SUMMARY_TEMPERATURE)
+async def condense_text_with_openai(client, limiter, text, model=ANALYSIS_MODEL):
+    """Condense analyses into a single paragraph with OpenAI API."""
+    content = CONDENSE_PROMPT.format(text=text)
+    try:
+        response = await create_completion(
+            client,
+            limiter,
+            count_tokens(content) + CONDENSE_MAX_TOKENS,
+            model=model,
+            messages=[{"role": "user", "content": content}],
+            max_tokens=CONDENSE_MAX_TOKENS,
+            temperature=SUMMARY_TEMPERATURE,
         )
         return response.choices[0].message.content
+    except Exception as e:
+        logging.error(f"Error condensing text with OpenAI: {e}")
+        return ""
+
+
+async def summarize_pdfs(client, limiter, all_analyses):
+    """Map-reduce the chunk analyses of every PDF into summaries that fit the report prompt.
+
+    Each PDF is condensed into one paragraph in parallel, and the paragraphs are then
+    folded in token-bounded groups until they fit in SUMMARY_MAX_INPUT_TOKENS.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    progress = tqdm(desc="Summarizing")
+
+    async def condense(text):
+        async with semaphore:
+            summary = await condense_text_with_openai(client, limiter, text)
+        progress.update()
+        return summary
+
+    async def fold(texts, max_tokens):
+        groups = group_by_tokens(texts, max_tokens)
+        while len(groups) > 1:
+            texts = await asyncio.gather(*(condense("\n\n".join(g)) for g in groups))
+            groups = group_by_tokens([text for text in texts if text], max_tokens)
+        return "\n\n".join(groups[0]) if groups else ""
+
+    async def summarize_pdf(pdf_file, analyses):
+        analysis = await fold(analyses, CONDENSE_MAX_INPUT_TOKENS)
+        summary = await condense(f"=== ANALYSIS OF DOCUMENT: {pdf_file} ===\n\n{analysis}")
+        return f"=== SUMMARY OF DOCUMENT: {pdf_file} ===\n\n{summary}" if summary else ""
+
+    pdf_summaries = await asyncio.gather(
+        *(
+            summarize_pdf(pdf_file, analyses)
+            for pdf_file, analyses in all_analyses.items()
+            if analyses
+        )
+    )
+    summaries = await fold(
+        [summary for summary in pdf_summaries if summary], SUMMARY_MAX_INPUT_TOKENS
+    )
+    progress.close()
+    return summaries
+
+
+async def generate_summary_report(client, analyses, model=SUMMARY_MODEL):
+    """Generate a comprehensive summary report from all analyses."""
+    try:
+        async for attempt in retrying():
+            with attempt:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are a historical researcher specializing in the JFK assassination.",
+                        },
+                        {"role": "user", "content": SUMMARY_PROMPT.format(analyses=analyses)},
+                    ],
+                    max_tokens=4000,
+                    temperature=SUMMARY_TEMPERATURE,
+                )
+        return response.choices[0].message.content
     except Exception as e:
         logging.error(f"Error generating summary with OpenAI: {e}")
         return "Failed to generate summary report due to an error."
 
 
-def save_analyses_to_file(analyses):
-    """Save individual document analyses to a JSON file."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    json_path = os.path.join(OUTPUT_DIR, f"jfk_analyses_{timestamp}.json")
+def load_analyses_file(jsonl_path):
+    """Load completed chunk analyses from a JSONL file, keyed by (pdf_file, index)."""
+    completed = {}
+    if not os.path.exists(jsonl_path):
+        return completed
+
+    with open(jsonl_path, "rb") as f:
+        data = f.read()
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # Torn record from an interrupted write
+        completed[(record["pdf"], record["chunk"])] = record["analysis"]
+
+    # Terminate a torn last record so that appended records start on a new line
+    if data and not data.endswith(b"\n"):
+        with open(jsonl_path, "a", encoding="utf-8") as f:
+            f.write("\n")
+
+    logging.info(f"Loaded {len(completed)} completed chunk analyses from {jsonl_path}")
+    return completed
+
+
+def file_sha256(path):
+    """Compute the SHA-256 hex digest of a file, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_pdf(pdf_path, entry):
+    """Return the mtime and SHA-256 of a PDF, reusing the manifest digest if the mtime is unchanged."""
+    mtime = os.path.getmtime(pdf_path)
+    if entry.get("mtime") == mtime and "sha256" in entry:
+        return {"mtime": mtime, "sha256": entry["sha256"]}
+    return {"mtime": mtime, "sha256": file_sha256(pdf_path)}
+
+
+def analysis_settings(max_chunks):
+    """Describe how PDFs are analyzed, so that a rerun with other settings analyzes them again."""
+    prompt = ANALYSIS_INSTRUCTIONS + DOCUMENT_TEMPLATE + BATCH_INSTRUCTIONS
+    return {
+        "model": ANALYSIS_MODEL,
+        "temperature": ANALYSIS_TEMPERATURE,
+        "prompt_sha256": hashlib.sha256(prompt.encode()).hexdigest(),
+        "max_tokens": MAX_TOKENS,
+        "overlap_tokens": OVERLAP_TOKENS,
+        "max_chunks_per_pdf": max_chunks,
+        "min_chunk_words": MIN_CHUNK_WORDS,
+        "min_unique_word_ratio": MIN_UNIQUE_WORD_RATIO,
+    }
+
+
+def load_manifest():
+    """Load the manifest of the PDFs analyzed by previous runs."""
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable manifest {MANIFEST_PATH}: {e}")
+        return {}
 
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(analyses, f, ensure_ascii=False, indent=4)
 
-    logging.info(f"Saved analyses to {json_path}")
-    return json_path
+def save_manifest(manifest):
+    """Atomically save the manifest for the next run."""
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, MANIFEST_PATH)
 
 
 def save_report_to_file(report):
@@ -163,14 +727,19 @@ def save_report_to_file(report):
     return report_path
 
 
-def main():
+async def main():
+    args = parse_args()
+    cache.enabled = not args.no_cache
+
     # Ensure OpenAI API key is set
     if not os.environ.get("OPENAI_API_KEY"):
         api_key = input("Please enter your OpenAI API key: ").strip()
         os.environ["OPENAI_API_KEY"] = api_key
-        openai.api_key = api_key
-    else:
-        openai.api_key = os.environ.get("OPENAI_API_KEY")
+
+    # retrying() is the only retry policy, so that every attempt goes through the limiter
+    client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"], max_retries=0)
+    # Share the account rate limits between the analysis and summary steps
+    limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE)
 
     create_output_directory()
 
@@ -183,56 +752,84 @@ def main():
 
     logging.info(f"Found {len(pdf_files)} PDF files")
 
-    # Analyze each PDF file
+    # Skip the PDFs whose content was completely analyzed by a previous run with the
+    # same settings, unless the cached analyses are being bypassed
+    manifest = load_manifest()
+    settings = analysis_settings(args.max_chunks_per_pdf)
+    fingerprints = {}
+    analyzed = {}
+    for pdf_file in pdf_files:
+        entry = manifest.get(pdf_file, {})
+        fingerprints[pdf_file] = fingerprint_pdf(os.path.join(PDF_DIR, pdf_file), entry)
+        if (
+            not args.no_cache
+            and entry.get("sha256") == fingerprints[pdf_file]["sha256"]
+            and entry.get("settings") == settings
+            and os.path.exists(entry.get("analysis_path", ""))
+        ):
+            analyzed[pdf_file] = entry["analysis_path"]
+            manifest[pdf_file] = {**entry, **fingerprints[pdf_file]}
+    pending_files = [pdf_file for pdf_file in pdf_files if pdf_file not in analyzed]
+    logging.info(f"Skipping {len(analyzed)} PDFs analyzed by previous runs")
+
+    # Append chunk analyses to a new JSONL file, or to the one being resumed
+    if args.resume:
+        analyses_path = args.resume
+        completed = load_analyses_file(analyses_path)
+    else:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        analyses_path = os.path.join(OUTPUT_DIR, f"jfk_analyses_{timestamp}.jsonl")
+        completed = {}
+
+    # Stream, deduplicate and analyze the chunks of every new or changed PDF
+    results, chunk_counts, failed = {}, {}, set()
+    if pending_files:
+        with open(analyses_path, "a", encoding="utf-8") as analyses_file:
+            pipeline = AnalysisPipeline(
+                client, limiter, analyses_file, completed, args.max_chunks_per_pdf
+            )
+            results, chunk_counts = await pipeline.run(pending_files)
+        failed = pipeline.failed
+        logging.info(f"Saved analyses to {analyses_path}")
+
+    # Reassemble the chunk analyses of each PDF in their original order, and record
+    # the PDFs whose text was fully extracted and whose selected chunks were all analyzed
     all_analyses = {}
-
-    for pdf_file in tqdm(pdf_files, desc="Analyzing PDFs"):
-        pdf_path = os.path.join(PDF_DIR, pdf_file)
-        logging.info(f"Processing {pdf_file}")
-
-        # Extract text from PDF
-        text = extract_text_from_pdf(pdf_path)
-        if not text.strip():
-            logging.warning(f"No text content extracted from {pdf_file}")
-            continue
-
-        # Split text into chunks
-        chunks = split_text_into_chunks(text)
-        logging.info(f"Split {pdf_file} into {len(chunks)} chunks")
-
-        # Analyze each chunk
-        chunk_analyses = []
-        for i, chunk in enumerate(chunks):
-            logging.info(f"Analyzing chunk {i+1}/{len(chunks)} of {pdf_file}")
-            analysis = analyze_text_with_openai(chunk)
-            if analysis:
-                chunk_analyses.append(analysis)
-            time.sleep(1)  # Rate limiting
-
-        # Combine analyses for this PDF
-        all_analyses[pdf_file] = "\n\n".join(chunk_analyses)
-
-    # Save individual analyses
-    analyses_path = save_analyses_to_file(all_analyses)
-
-    # Prepare combined analyses for summary
-    combined_analyses = ""
-    for pdf_file, analysis in all_analyses.items():
-        combined_analyses += (
-            f"=== ANALYSIS OF DOCUMENT: {pdf_file} ===\n\n{analysis}\n\n"
-        )
+    for pdf_file, count in chunk_counts.items():
+        chunk_analyses = [results.get((pdf_file, i)) for i in range(count)]
+        all_analyses[pdf_file] = [a for a in chunk_analyses if a]
+        if count and pdf_file not in failed and "" not in chunk_analyses:
+            manifest[pdf_file] = {
+                **fingerprints[pdf_file],
+                "settings": settings,
+                "analysis_path": analyses_path,
+            }
+    save_manifest(manifest)
+
+    # Reuse the analyses of the skipped PDFs from the files they were recorded in
+    for analysis_path in set(analyzed.values()):
+        for (pdf_file, i), analysis in sorted(load_analyses_file(analysis_path).items()):
+            if analyzed.get(pdf_file) == analysis_path:
+                all_analyses.setdefault(pdf_file, []).append(analysis)
+
+    # Condense the analyses of each PDF before combining them
+    logging.info("Summarizing document analyses...")
+    combined_summaries = await summarize_pdfs(client, limiter, all_analyses)
 
     # Generate comprehensive report
     logging.info("Generating comprehensive report...")
-    final_report = generate_summary_report(combined_analyses)
+    final_report = await generate_summary_report(client, combined_summaries)
 
     # Save final report
     report_path = save_report_to_file(final_report)
 
+    cache.close()
+
     logging.info("Analysis complete!")
-    logging.info(f"Individual analyses saved to: {analyses_path}")
+    if pending_files:
+        logging.info(f"Individual analyses saved to: {analyses_path}")
     logging.info(f"Final report saved to: {report_path}")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,20 +1,22 @@
 import os
+import argparse
 import logging
-import time
 import json
 from datetime import datetime
 from tqdm import tqdm
 from typing import List, Dict, Any
 
 # LangChain imports
-from langchain.document_loaders import PyPDFLoader
+from langchain_community.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import Document
 from langchain.chat_models import ChatOpenAI
+from langchain_core.rate_limiters import InMemoryRateLimiter
 from langchain.chains import LLMChain
 from langchain.chains.summarize import load_summarize_chain
-from langchain.chains.combine_documents.stuff import StuffDocumentsChain
+
+from llm_cache import LLMCache, cached_llm
 
 # Set up logging
 logging.basicConfig(
@@ -29,22 +31,41 @@ logging.basicConfig(
 # Constants
 PDF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+ANALYSIS_MODEL = "gpt-4o-mini"  # Fast, cheap model for the per-chunk analyses
+SUMMARY_MODEL = "gpt-4o"  # Flagship model for the final report
+ANALYSIS_TEMPERATURE = 0.2
+SUMMARY_TEMPERATURE = 0.3
+CONDENSE_MAX_INPUT_TOKENS = 50000  # Maximum number of tokens of analyses condensed in one request
+SUMMARY_MAX_INPUT_TOKENS = 100000  # Maximum number of tokens of summaries in the report prompt
+MAX_REQUESTS_PER_MINUTE = 500  # Account rate limit for requests to ANALYSIS_MODEL
+MAX_RETRIES = 7  # Retries of each OpenAI request, with exponential backoff
 
 # Configuration for analysis
-ANALYSIS_TEMPLATE = """
+ANALYSIS_INSTRUCTIONS = """
 You are an expert historian and intelligence analyst reviewing declassified JFK assassination documents.
-Based on the following document excerpt, please:
+Based on the document excerpt provided by the user, please:
 1. Identify key information related to potential motives for Kennedy's assassination
 2. Note any suspicious activities, connections, or entities mentioned
 3. Look for information about Lee Harvey Oswald and his potential connections
 4. Extract details about any conspiracy theories supported by the documents
 5. Identify any cover-up attempts or inconsistencies in the official narrative
 
+Provide a detailed, objective analysis focusing only on information present in the excerpt that might help answer 
+"Why was President Kennedy assassinated?" Do not speculate beyond what's in the text.
+"""
+
+DOCUMENT_TEMPLATE = """
 Document excerpt:
 {text}
+"""
 
-Provide a detailed, objective analysis focusing only on information present in this excerpt that might help answer 
-"Why was President Kennedy assassinated?" Do not speculate beyond what's in the text.
+CONDENSE_TEMPLATE = """
+You are a historical researcher condensing analyses of declassified JFK assassination documents.
+Summarize the following analyses in a single dense paragraph. Keep the names, dates, places, organizations,
+connections and suspected motives that help answer "Why was President Kennedy assassinated?", and keep the
+names of the documents they come from so that they can be cited. Do not add anything that is not in the analyses.
+
+{text}
 """
 
 SUMMARY_TEMPLATE = """
@@ -66,6 +87,25 @@ conclusion that offers your assessment on the most probable explanation for Kenn
 this documentary evidence.
 """
 
+# Cache of chunk analyses shared across runs
+cache = LLMCache()
+
+# Throttle requests to the account rate limit instead of sleeping after each one
+rate_limiter = InMemoryRateLimiter(requests_per_second=MAX_REQUESTS_PER_MINUTE / 60)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Analyze JFK documents with LangChain."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore and do not update the on-disk LLM response cache",
+    )
+    return parser.parse_args()
+
 
 def create_output_directory() -> None:
     """Create the output directory if it doesn't exist."""
@@ -77,7 +117,7 @@ def create_output_directory() -> None:
 def load_pdf_documents(pdf_path: str) -> List[Document]:
     """Load a PDF file and convert it to LangChain documents."""
     try:
-        loader = PyPDFLoader(pdf_path)
+        loader = PyMuPDFLoader(pdf_path)
         documents = loader.load()
         return documents
     except Exception as e:
@@ -99,16 +139,29 @@ def split_documents(documents: List[Document]) -> List[Document]:
         return documents
 
 
+@cached_llm(cache, ANALYSIS_INSTRUCTIONS + DOCUMENT_TEMPLATE, ANALYSIS_TEMPERATURE)
+def run_analysis_chain(chain: LLMChain, text: str, model: str) -> str:
+    """Run the analysis chain on a single chunk of text."""
+    return chain.run(text=text)
+
+
 def analyze_document_chunks(
-    chunks: List[Document], model_name: str = "gpt-4"
+    chunks: List[Document], model_name: str = ANALYSIS_MODEL
 ) -> List[str]:
     """Analyze document chunks using LangChain and LLM."""
     try:
         # Create prompt template
-        prompt = ChatPromptTemplate.from_template(ANALYSIS_TEMPLATE)
+        prompt = ChatPromptTemplate.from_messages(
+            [("system", ANALYSIS_INSTRUCTIONS), ("human", DOCUMENT_TEMPLATE)]
+        )
 
         # Initialize the LLM
-        llm = ChatOpenAI(model_name=model_name, temperature=0.2)
+        llm = ChatOpenAI(
+            model_name=model_name,
+            temperature=ANALYSIS_TEMPERATURE,
+            max_retries=MAX_RETRIES,
+            rate_limiter=rate_limiter,
+        )
 
         # Create the chain
         chain = LLMChain(llm=llm, prompt=prompt)
@@ -117,9 +170,8 @@ def analyze_document_chunks(
         results = []
         for i, chunk in enumerate(tqdm(chunks, desc="Analyzing chunks")):
             logging.info(f"Analyzing chunk {i+1}/{len(chunks)}")
-            response = chain.run(text=chunk.page_content)
+            response = run_analysis_chain(chain, chunk.page_content, model_name)
             results.append(response)
-            time.sleep(1)  # Rate limiting
 
         return results
     except Exception as e:
@@ -128,33 +180,63 @@ def analyze_document_chunks(
 
 
 def create_final_report(
-    all_analyses: Dict[str, List[str]], model_name: str = "gpt-4"
+    all_analyses: Dict[str, List[str]],
+    model_name: str = SUMMARY_MODEL,
+    map_model_name: str = ANALYSIS_MODEL,
 ) -> str:
-    """Create a final comprehensive report from all document analyses."""
-    try:
-        # Combine all analyses into a single text
-        combined_analyses = ""
-        for pdf_file, analyses in all_analyses.items():
-            combined_analyses += f"=== ANALYSIS OF DOCUMENT: {pdf_file} ===\n\n"
-            combined_analyses += "\n\n".join(analyses)
-            combined_analyses += "\n\n"
-
-        # Create documents for the summarization chain
-        docs = [Document(page_content=combined_analyses)]
-
-        # Create the prompt template
-        prompt = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE)
+    """Create a final comprehensive report from all document analyses.
 
-        # Initialize the LLM
-        llm = ChatOpenAI(model_name=model_name, temperature=0.3)
+    The analyses of each PDF are first condensed into summaries (map), and the summaries
+    are then collapsed as needed and combined into the report (reduce).
+    """
+    try:
+        # Split the analyses of each PDF into documents that fit a single map request
+        splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            model_name=map_model_name,
+            chunk_size=CONDENSE_MAX_INPUT_TOKENS,
+            chunk_overlap=0,
+        )
+        docs = [
+            Document(
+                page_content=f"=== ANALYSIS OF DOCUMENT: {pdf_file} ===\n\n{text}",
+                metadata={"source": pdf_file},
+            )
+            for pdf_file, analyses in all_analyses.items()
+            if analyses
+            for text in splitter.split_text("\n\n".join(analyses))
+        ]
+
+        # Create the prompt templates
+        condense_prompt = ChatPromptTemplate.from_template(CONDENSE_TEMPLATE)
+        summary_prompt = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE)
+
+        # Initialize the LLMs
+        map_llm = ChatOpenAI(
+            model_name=map_model_name,
+            temperature=SUMMARY_TEMPERATURE,
+            max_retries=MAX_RETRIES,
+            rate_limiter=rate_limiter,
+        )
+        llm = ChatOpenAI(
+            model_name=model_name,
+            temperature=SUMMARY_TEMPERATURE,
+            max_retries=MAX_RETRIES,
+            rate_limiter=rate_limiter,
+        )
 
-        # Create the summarization chain
-        stuff_chain = StuffDocumentsChain(
-            llm_chain=LLMChain(llm=llm, prompt=prompt), document_variable_name="text"
+        # Create the map-reduce summarization chain
+        summarize_chain = load_summarize_chain(
+            map_llm,
+            chain_type="map_reduce",
+            map_prompt=condense_prompt,
+            collapse_prompt=condense_prompt,
+            combine_prompt=summary_prompt,
+            reduce_llm=llm,
+            token_max=SUMMARY_MAX_INPUT_TOKENS,
         )
 
         # Run the chain
-        final_report = stuff_chain.run(docs)
+        final_report = summarize_chain.run(docs)
         return final_report
     except Exception as e:
         logging.error(f"Error creating final report: {e}")
@@ -193,6 +275,9 @@ def save_report_to_file(report: str) -> str:
 
 
 def main() -> None:
+    args = parse_args()
+    cache.enabled = not args.no_cache
+
     # Ensure OpenAI API key is set
     if not os.environ.get("OPENAI_API_KEY"):
         api_key = input("Please enter your OpenAI API key: ").strip()
@@ -241,6 +326,8 @@ def main() -> None:
     # Save final report
     report_path = save_report_to_file(final_report)
 
+    cache.close()
+
     logging.info("Analysis complete!")
     logging.info(f"Individual analyses saved to: {analyses_path}")
     logging.info(f"Final report saved to: {report_path}")
@@ -1,10 +1,21 @@
 import os
-import requests
-from bs4 import BeautifulSoup
-import time
+import asyncio
+import json
+import aiohttp
+import aiofiles
+import lxml.html
+from lxml import etree
 import re
+import tempfile
+from collections import defaultdict, deque
 from urllib.parse import urljoin, urlparse
 import logging
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential,
+)
 
 # Set up logging
 logging.basicConfig(
@@ -17,6 +28,26 @@ logging.basicConfig(
 BASE_URL = "https://www.archives.gov/research/jfk/release-2025"
 PDF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf")
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+DOWNLOAD_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "download_cache.json"
+)
+MAX_CONCURRENT_REQUESTS_PER_HOST = 8  # Be nice to the server
+MAX_CONNECTIONS = 32  # Size of the pool of kept-alive connections
+DOWNLOAD_CHUNK_SIZE = 1 << 20  # Size of the blocks written to disk when downloading
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+NOT_MODIFIED = object()  # Returned when a conditional GET gets a 304
+UNSAFE_FILENAME_CHARS_RE = re.compile(r"[^\w\-.]")  # Characters replaced in filenames
+XML_DECLARATION_RE = re.compile(r"^\ufeff?\s*<\?xml[^>]*\?>")  # Rejected by lxml in str input
+
+# Compiled XPath expressions for link extraction
+PDF_LINKS_XPATH = etree.XPath(
+    r"//a/@href[re:test(., '\.pdf$', 'i')]",
+    namespaces={"re": "http://exslt.org/regular-expressions"},
+)
+PAGINATION_LINKS_XPATH = etree.XPath(
+    "(//div[contains(concat(' ', normalize-space(@class), ' '), ' pagination ')])[1]"
+    "//a/@href"
+)
 
 
 def create_pdf_directory():
@@ -26,15 +57,89 @@ def create_pdf_directory():
         logging.info(f"Created directory: {PDF_DIR}")
 
 
-def get_page_content(url):
-    """Get the HTML content of a page."""
-    headers = {"User-Agent": USER_AGENT}
+def load_download_cache():
+    """Load the ETag/Last-Modified validators saved by previous runs."""
+    if not os.path.exists(DOWNLOAD_CACHE_PATH):
+        return {}
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
+        with open(DOWNLOAD_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable download cache {DOWNLOAD_CACHE_PATH}: {e}")
+        return {}
+
+
+def save_download_cache(download_cache):
+    """Atomically save the validators for the next run."""
+    tmp_path = DOWNLOAD_CACHE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(download_cache, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, DOWNLOAD_CACHE_PATH)
+
+
+def conditional_headers(entry):
+    """Build conditional GET headers from cached validators."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def response_validators(response):
+    """Extract the validators of a response for later conditional GETs."""
+    validators = {}
+    if "ETag" in response.headers:
+        validators["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        validators["last_modified"] = response.headers["Last-Modified"]
+    return validators
+
+
+def is_transient_error(exception):
+    """Check whether a failed request is worth retrying."""
+    if isinstance(exception, aiohttp.ClientResponseError):
+        return exception.status in RETRY_STATUSES
+    return isinstance(exception, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def retrying():
+    """Retry transient errors with exponential backoff."""
+    return AsyncRetrying(
+        retry=retry_if_exception(is_transient_error),
+        wait=wait_exponential(multiplier=0.5, max=30),
+        stop=stop_after_attempt(5),
+        reraise=True,
+    )
+
+
+async def get_page_content(session, url, entry=None):
+    """Get the HTML content and validators of a page.
+
+    Returns NOT_MODIFIED if the page is unchanged since the cache entry was saved.
+    """
+    headers = conditional_headers(entry or {})
+    try:
+        async for attempt in retrying():
+            with attempt:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        return NOT_MODIFIED, entry
+                    response.raise_for_status()
+                    return await response.text(), response_validators(response)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.error(f"Error fetching {url}: {e}")
+        return None, None
+
+
+def parse_html(html_content):
+    """Parse HTML content into an lxml document, or None if it cannot be parsed."""
+    try:
+        # The content is already decoded, so its encoding declaration must go
+        return lxml.html.fromstring(XML_DECLARATION_RE.sub("", html_content, count=1))
+    except (etree.ParserError, ValueError) as e:
+        logging.error(f"Error parsing HTML: {e}")
         return None
 
 
@@ -43,17 +148,11 @@ def extract_pdf_links(html_content):
     if not html_content:
         return []
 
-    soup = BeautifulSoup(html_content, "html.parser")
-    pdf_links = []
-
-    # Find all anchor tags
-    for a_tag in soup.find_all("a", href=True):
-        href = a_tag["href"]
-        # Check if the link points to a PDF file
-        if href.lower().endswith(".pdf"):
-            pdf_links.append(href)
+    doc = parse_html(html_content)
+    if doc is None:
+        return []
 
-    return pdf_links
+    return [str(href) for href in PDF_LINKS_XPATH(doc)]
 
 
 def extract_pagination_links(html_content, base_url):
@@ -61,16 +160,13 @@ def extract_pagination_links(html_content, base_url):
     if not html_content:
         return []
 
-    soup = BeautifulSoup(html_content, "html.parser")
-    pagination_div = soup.find("div", class_="pagination")
-
-    if not pagination_div:
+    doc = parse_html(html_content)
+    if doc is None:
         return []
 
     pagination_links = []
 
-    for a_tag in pagination_div.find_all("a", href=True):
-        href = a_tag["href"]
+    for href in PAGINATION_LINKS_XPATH(doc):
         full_url = urljoin(base_url, href)
         if full_url != base_url and full_url not in pagination_links:
             pagination_links.append(full_url)
@@ -78,91 +174,189 @@ def extract_pagination_links(html_content, base_url):
     return pagination_links
 
 
-def download_pdf(pdf_url, save_path):
-    """Download a PDF file and save it to the specified path."""
-    headers = {"User-Agent": USER_AGENT}
-    try:
-        response = requests.get(pdf_url, headers=headers, stream=True)
-        response.raise_for_status()
-
-        with open(save_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+async def download_pdf(session, pdf_url, save_path, download_cache):
+    """Download a PDF file and save it to the specified path.
 
+    Returns NOT_MODIFIED if the PDF is unchanged since it was last downloaded.
+    """
+    headers = {}
+    if os.path.exists(save_path):
+        headers = conditional_headers(download_cache.get(pdf_url, {}))
+    tmp_path = None
+    try:
+        # Give each download its own temporary file next to its destination
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(save_path) + ".",
+            suffix=".part",
+            dir=os.path.dirname(save_path),
+        )
+        os.close(fd)
+        async for attempt in retrying():
+            with attempt:
+                async with session.get(pdf_url, headers=headers) as response:
+                    if response.status == 304:
+                        return NOT_MODIFIED
+                    response.raise_for_status()
+
+                    async with aiofiles.open(tmp_path, "wb") as f:
+                        # Preallocate the file, unless the body is decompressed on the fly
+                        size = response.content_length
+                        if size and "Content-Encoding" not in response.headers:
+                            await f.truncate(size)
+                        # Reads return whatever is buffered, so collect them into
+                        # full blocks before handing them to the writer thread
+                        buffer = bytearray()
+                        async for chunk in response.content.iter_chunked(
+                            DOWNLOAD_CHUNK_SIZE
+                        ):
+                            buffer += chunk
+                            if len(buffer) >= DOWNLOAD_CHUNK_SIZE:
+                                await f.write(buffer)
+                                buffer.clear()
+                        if buffer:
+                            await f.write(buffer)
+                    validators = response_validators(response)
+
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files only readable by their owner
+        os.replace(tmp_path, save_path)
+        if validators:
+            download_cache[pdf_url] = validators
+        else:
+            # Without validators the PDF cannot be revalidated, so it is skipped next time
+            download_cache.pop(pdf_url, None)
         return True
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        # A failed download must not abort the others gathered with it
         logging.error(f"Error downloading {pdf_url}: {e}")
         return False
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 def get_filename_from_url(url):
     """Extract a valid filename from a URL."""
-    parsed_url = urlparse(url)
-    path = parsed_url.path
-    filename = os.path.basename(path)
+    filename = os.path.basename(urlparse(url).path)
 
     # Clean the filename to ensure it's valid
-    filename = re.sub(r"[^\w\-\.]", "_", filename)
+    return UNSAFE_FILENAME_CHARS_RE.sub("_", filename)
 
-    return filename
+
+async def download_pdf_bounded(session, semaphores, pdf_url, save_path, download_cache):
+    """Download a PDF file while holding the semaphore of its host."""
+    filename = os.path.basename(save_path)
+    async with semaphores[urlparse(pdf_url).netloc]:
+        logging.info(f"Downloading: {filename}")
+        result = await download_pdf(session, pdf_url, save_path, download_cache)
+    if result is NOT_MODIFIED:
+        logging.info(f"Skipping unchanged: {filename}")
+        return False
+    if result:
+        logging.info(f"Successfully downloaded: {filename}")
+    return result
 
 
-def main():
+async def main():
     create_pdf_directory()
+    download_cache = load_download_cache()
 
     # Start with the base URL
-    pages_to_visit = [BASE_URL]
+    pages_to_visit = deque([BASE_URL])
+    enqueued_pages = {BASE_URL}
     visited_pages = set()
     downloaded_pdfs = set()
-
-    while pages_to_visit:
-        current_page = pages_to_visit.pop(0)
-        if current_page in visited_pages:
-            continue
-
-        logging.info(f"Visiting page: {current_page}")
-        visited_pages.add(current_page)
-
-        html_content = get_page_content(current_page)
-        if not html_content:
-            continue
-
-        # Extract PDF links
-        pdf_links = extract_pdf_links(html_content)
-        for pdf_link in pdf_links:
-            full_pdf_url = urljoin(current_page, pdf_link)
-
-            if full_pdf_url in downloaded_pdfs:
-                continue
-
-            filename = get_filename_from_url(full_pdf_url)
-            save_path = os.path.join(PDF_DIR, filename)
-
-            # Skip if already downloaded
-            if os.path.exists(save_path):
-                logging.info(f"Skipping already downloaded: {filename}")
-                downloaded_pdfs.add(full_pdf_url)
-                continue
-
-            logging.info(f"Downloading: {filename}")
-            if download_pdf(full_pdf_url, save_path):
-                logging.info(f"Successfully downloaded: {filename}")
-                downloaded_pdfs.add(full_pdf_url)
-
-            # Be nice to the server
-            time.sleep(1)
-
-        # Find pagination links
-        pagination_links = extract_pagination_links(html_content, current_page)
-
-        # Add new pagination links to pages_to_visit if they haven't been visited
-        for link in pagination_links:
-            if link not in visited_pages and link not in pages_to_visit:
-                pages_to_visit.append(link)
-
+    scheduled_paths = set()
+    downloads = []
+
+    # Limit the number of simultaneous requests to each host
+    semaphores = defaultdict(
+        lambda: asyncio.Semaphore(MAX_CONCURRENT_REQUESTS_PER_HOST)
+    )
+
+    # Large PDFs can take longer than aiohttp's default 5 minute total timeout
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    async with aiohttp.ClientSession(
+        headers={"User-Agent": USER_AGENT}, timeout=timeout, connector=connector
+    ) as session:
+        try:
+            while pages_to_visit:
+                current_page = pages_to_visit.popleft()
+                if current_page in visited_pages:
+                    continue
+
+                logging.info(f"Visiting page: {current_page}")
+                visited_pages.add(current_page)
+
+                async with semaphores[urlparse(current_page).netloc]:
+                    html_content, entry = await get_page_content(
+                        session, current_page, download_cache.get(current_page)
+                    )
+                if not html_content:
+                    continue
+
+                if html_content is NOT_MODIFIED:
+                    # Reuse the links found when the page was last fetched
+                    logging.info(f"Page unchanged: {current_page}")
+                    pdf_links = entry["pdf_links"]
+                    pagination_links = entry["pagination_links"]
+                else:
+                    pdf_links = extract_pdf_links(html_content)
+                    pagination_links = extract_pagination_links(
+                        html_content, current_page
+                    )
+                    if entry:
+                        download_cache[current_page] = {
+                            **entry,
+                            "pdf_links": pdf_links,
+                            "pagination_links": pagination_links,
+                        }
+                    else:
+                        download_cache.pop(current_page, None)
+
+                # Download the PDFs in the background
+                for pdf_link in pdf_links:
+                    full_pdf_url = urljoin(current_page, pdf_link)
+
+                    if full_pdf_url in downloaded_pdfs:
+                        continue
+                    downloaded_pdfs.add(full_pdf_url)
+
+                    filename = get_filename_from_url(full_pdf_url)
+                    save_path = os.path.join(PDF_DIR, filename)
+
+                    # Different URLs can map to the same filename; keep the first one
+                    if save_path in scheduled_paths:
+                        logging.info(f"Skipping duplicate filename: {filename}")
+                        continue
+                    scheduled_paths.add(save_path)
+
+                    # Skip if already downloaded, unless it can be revalidated
+                    if os.path.exists(save_path) and not download_cache.get(full_pdf_url):
+                        logging.info(f"Skipping already downloaded: {filename}")
+                        continue
+
+                    downloads.append(
+                        asyncio.create_task(
+                            download_pdf_bounded(
+                                session, semaphores, full_pdf_url, save_path, download_cache
+                            )
+                        )
+                    )
+
+                # Add new pagination links to pages_to_visit if they haven't been visited
+                for link in pagination_links:
+                    if link not in visited_pages and link not in enqueued_pages:
+                        pages_to_visit.append(link)
+                        enqueued_pages.add(link)
+
+            results = await asyncio.gather(*downloads)
+        finally:
+            save_download_cache(download_cache)
+
+    logging.info(f"Downloaded {sum(results)} of {len(results)} new or changed PDFs")
     logging.info("Download process completed.")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())